@@ -1,16 +1,14 @@
 import streamlit as st
 import google.generativeai as genai
-from PIL import Image
 import io
+import time
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib.colors import HexColor
-import tempfile
 from gemini_api import GEMINI_API_KEY
+from pdf_report import build_pdf_report, build_pdf_bundle
+from modality_classifier import predict_modality, is_local_answer
+from image_decode import probe_image, decode_image, PREVIEW_MAX_SIDE, MODEL_MAX_SIDE
+from report_scheduler import scheduler, wait_timeout, PRIORITIES, QueueFull
+from model_replay import create_backend
 
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
@@ -18,6 +16,12 @@ genai.configure(api_key=GEMINI_API_KEY)
 # Initialize the Gemini model
 model = genai.GenerativeModel('gemini-2.0-flash-exp')
 
+# Live, recording or replay backend, chosen by the MODEL_BACKEND environment variable
+@st.cache_resource
+def get_model_backend():
+    """Create the model backend once per process"""
+    return create_backend(model)
+
 # Page configuration
 st.set_page_config(
     page_title="RadiologyAI Pro - MedInsight AI",
@@ -169,134 +173,103 @@ st.markdown("""
 
 # Helper function to process image
 def process_image(uploaded_file):
-    """Convert uploaded file to PIL Image"""
+    """Read dimensions and format of the uploaded file from its header only"""
     try:
-        image = Image.open(uploaded_file)
-        return image
+        return probe_image(uploaded_file.getvalue())
     except Exception as e:
         st.error(f"❌ Error processing image: {str(e)}")
         return None
 
+# Helper function to decode the uploaded image at a given size
+def get_image(uploaded_file, max_side=None):
+    """Decode the uploaded file scaled to max_side, reusing earlier decodes"""
+    return decode_image(uploaded_file.getvalue(), max_side, key=getattr(uploaded_file, 'file_id', None))
+
 # Helper function to generate report using Gemini
-def generate_report(image, prompt):
-    """Generate report using Gemini API"""
+def generate_report(image, prompt, priority="Routine", modality=None, source=None, user=None):
+    """Generate report using Gemini API, queued by priority"""
+    # Taken before queueing so recordings keep the load as users created it
+    arrived_at = time.time()
     try:
+        ticket = scheduler.submit(priority, user=user, modality=modality)
+    except QueueFull as e:
+        st.warning(f"⏳ The system is busy. {priority} requests are paused; please retry in about {e.retry_after:.0f} seconds.")
+        return None
+    
+    try:
+        if ticket.started_at is None:
+            # Bounded so a stalled queue cannot block this session indefinitely;
+            # on timeout the ticket is withdrawn and never takes a model slot
+            with st.spinner(f"⏳ Queued as {priority}, expected wait about {ticket.expected_wait:.0f} seconds..."):
+                granted = scheduler.wait(ticket, timeout=wait_timeout(ticket.expected_wait))
+            if not granted:
+                retry_after = scheduler.expected_wait(priority)
+                st.warning(f"⏳ The system is busy. Your {priority} request was deferred; please retry in about {retry_after:.0f} seconds.")
+                return None
         with st.spinner("🔄 Analyzing image and generating report..."):
-            response = model.generate_content([prompt, image])
-            return response.text
+            return get_model_backend().generate(
+                prompt, image, {
+                    "priority": priority, "modality": modality, "user": ticket.user, "source": source,
+                    "arrived_at": arrived_at
+                }
+            )
     except Exception as e:
         st.error(f"❌ Error generating report: {str(e)}")
         return None
+    finally:
+        scheduler.release(ticket)
+
+# Helper function to classify modality offline, falling back to Gemini
+def classify_image(image, prompt, priority="Routine", source=None, user=None):
+    """Classify image modality with the local model; use Gemini when unsure"""
+    prediction = None
+    try:
+        prediction = predict_modality(image)
+    except Exception as e:
+        print(f"Local classifier unavailable: {e}")
+    
+    if not is_local_answer(prediction):
+        return generate_report(image, prompt, priority, "Image Classification", source, user)
+    
+    scores = "\n".join(
+        f"- {label}: {probability:.1%}"
+        for label, probability in sorted(prediction.probabilities.items(), key=lambda item: -item[1])
+    )
+    return (
+        f"## Classification: {prediction.label}\n\n"
+        f"**Confidence:** {prediction.confidence:.1%}\n\n"
+        f"**Scores:**\n{scores}\n\n"
+        f"*Classified offline by the local modality model in {prediction.elapsed_ms:.0f} ms "
+        f"from intensity histogram, field-of-view shape and colour features.*"
+    )
 
 # Function to create PDF report
-def create_pdf_report(report_text, image, report_type, patient_info=None):
+def create_pdf_report(report_text, image, report_type, patient_info=None, compact=False):
     """Create a PDF report with the analysis results"""
     try:
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=HexColor('#1e3a8a'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=16,
-            textColor=HexColor('#667eea'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Title
-        story.append(Paragraph("🏥 MEDICAL IMAGING ANALYSIS REPORT", title_style))
-        story.append(Spacer(1, 0.3*inch))
-        
-        # Report Information
-        story.append(Paragraph(f"<b>Report Type:</b> {report_type}", styles['Normal']))
-        story.append(Paragraph(f"<b>Date Generated:</b> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", styles['Normal']))
-        story.append(Spacer(1, 0.2*inch))
-        
-        # Add patient info if provided
-        if patient_info:
-            story.append(Paragraph("PATIENT INFORMATION", heading_style))
-            for key, value in patient_info.items():
-                story.append(Paragraph(f"<b>{key}:</b> {value}", styles['Normal']))
-            story.append(Spacer(1, 0.2*inch))
-        
-        # Add image if available
-        if image:
-            try:
-                # Save image temporarily
-                img_temp = tempfile.NamedTemporaryFile(delete=False, suffix='.png')
-                image.save(img_temp.name, format='PNG')
-                
-                # Add image to PDF
-                story.append(Paragraph("ANALYZED IMAGE", heading_style))
-                img = RLImage(img_temp.name, width=4*inch, height=3*inch)
-                story.append(img)
-                story.append(Spacer(1, 0.3*inch))
-            except Exception as e:
-                print(f"Could not add image to PDF: {e}")
-        
-        # Add report content
-        story.append(Paragraph("ANALYSIS REPORT", heading_style))
-        story.append(Spacer(1, 0.1*inch))
-        
-        # Process report text
-        for line in report_text.split('\n'):
-            if line.strip():
-                if line.startswith('#'):
-                    story.append(Paragraph(line.replace('#', '').strip(), heading_style))
-                else:
-                    story.append(Paragraph(line, styles['Normal']))
-                story.append(Spacer(1, 0.1*inch))
-        
-        # Disclaimer
-        story.append(Spacer(1, 0.3*inch))
-        disclaimer_style = ParagraphStyle(
-            'Disclaimer',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=HexColor('#dc2626'),
-            borderColor=HexColor('#dc2626'),
-            borderWidth=1,
-            borderPadding=10,
-            backColor=HexColor('#fef2f2')
-        )
-        story.append(Paragraph(
-            "<b>⚠️ IMPORTANT DISCLAIMER:</b> This report is generated by AI and is for preliminary analysis only. "
-            "All findings must be reviewed and validated by a qualified healthcare professional before making "
-            "any clinical decisions.",
-            disclaimer_style
-        ))
-        
-        # Build PDF
-        doc.build(story)
-        
-        # Read the PDF file
-        with open(temp_file.name, 'rb') as f:
-            pdf_data = f.read()
-        
-        return pdf_data
-    
+        return build_pdf_report(report_text, image, report_type, patient_info, compact=compact)
     except Exception as e:
         st.error(f"❌ Error creating PDF: {str(e)}")
         return None
 
+# Function to create a multi-study PDF bundle
+def create_pdf_bundle(reports, compact=False):
+    """Create one PDF containing every report in the bundle"""
+    try:
+        # Images are decoded from each study's source file at build time, at the
+        # same resolution the single-study PDF uses for the chosen mode
+        studies = []
+        for report in reports:
+            source_data, source_key = report['source']
+            studies.append(dict(
+                report,
+                image=decode_image(source_data, MODEL_MAX_SIDE if compact else None, key=source_key)
+            ))
+        return build_pdf_bundle(studies, compact=compact)
+    except Exception as e:
+        st.error(f"❌ Error creating PDF bundle: {str(e)}")
+        return None
+
 # Navigation
 st.sidebar.title("🏥 MedInsight AI")
 st.sidebar.markdown("### RadiologyAI Pro")
@@ -307,6 +280,16 @@ page = st.sidebar.radio(
     label_visibility="collapsed"
 )
 
+# Queue status across all sessions
+with st.sidebar.expander("⏳ Queue Status"):
+    for queue_priority, queue_stats in scheduler.stats().items():
+        st.markdown(
+            f"**{queue_priority}:** {queue_stats['waiting']} waiting, {queue_stats['running']} running  \n"
+            f"wait mean {queue_stats['mean_wait']:.1f}s, p95 {queue_stats['p95_wait']:.1f}s, "
+            f"max {queue_stats['max_wait']:.1f}s ({queue_stats['served']} served, {queue_stats['rejected']} rejected, "
+            f"{queue_stats['timed_out']} timed out)"
+        )
+
 # Extract page name without emoji
 page_name = page.split(' ', 1)[1] if ' ' in page else page
 
@@ -654,24 +637,48 @@ else:
         
         with col1:
             st.markdown("### 🖼️ Uploaded Image")
-            image = process_image(uploaded_file)
-            if image:
-                st.image(image, use_container_width=True, caption=f"Uploaded: {uploaded_file.name}")
+            image_info = process_image(uploaded_file)
+            if image_info:
+                st.image(get_image(uploaded_file, PREVIEW_MAX_SIDE), use_container_width=True, caption=f"Uploaded: {uploaded_file.name}")
                 
                 # Image info
                 st.markdown(f"""
                 <div class="feature-card">
                     <b>File Name:</b> {uploaded_file.name}<br>
                     <b>File Size:</b> {uploaded_file.size / 1024:.2f} KB<br>
-                    <b>Image Dimensions:</b> {image.size[0]} x {image.size[1]} px
+                    <b>Image Dimensions:</b> {image_info.width} x {image_info.height} px<br>
+                    <b>Format:</b> {image_info.format}
                 </div>
                 """, unsafe_allow_html=True)
         
         with col2:
             st.markdown("### 📊 Analysis Results")
             
+            priority = st.selectbox(
+                "Priority",
+                PRIORITIES,
+                index=PRIORITIES.index("Routine"),
+                help="STAT requests are served first and are never turned away when the system is busy"
+            )
+            st.caption(f"⏱️ Expected wait: about {scheduler.expected_wait(priority):.0f} seconds")
+            
             if st.button("🚀 Generate Report", use_container_width=True, type="primary"):
-                result = generate_report(image, prompt)
+                image = get_image(uploaded_file, MODEL_MAX_SIDE) if image_info else None
+                # Requests are capped per referring physician; a Streamlit session
+                # only ever has one request in flight, so it cannot serve as the user
+                requesting_user = referring_physician.strip().lower() or None
+                # The uploaded file as received, recorded so replays decode inputs of the same size
+                source = {
+                    "width": image_info.width,
+                    "height": image_info.height,
+                    "format": image_info.format,
+                    "mode": image_info.mode,
+                    "bytes": uploaded_file.size
+                } if image_info else None
+                if "Classification" in page_name:
+                    result = classify_image(image, prompt, priority, source, requesting_user)
+                else:
+                    result = generate_report(image, prompt, priority, report_type, source, requesting_user)
                 
                 if result:
                     st.markdown('<div class="report-box">', unsafe_allow_html=True)
@@ -681,6 +688,7 @@ else:
                     # Store in session state for download
                     st.session_state['report_text'] = result
                     st.session_state['report_image'] = image
+                    st.session_state['report_source'] = (uploaded_file.getvalue(), getattr(uploaded_file, 'file_id', None))
                     st.session_state['report_type'] = report_type
                     
                     st.success("✅ Report generated successfully!")
@@ -692,6 +700,12 @@ else:
             st.markdown("---")
             st.markdown("### 📥 Download Report")
             
+            compact_pdf = st.checkbox(
+                "Compact PDF",
+                value=False,
+                help="Embed the image as a JPEG resampled to print resolution instead of a full-size PNG"
+            )
+            
             col1, col2, col3 = st.columns([1, 1, 1])
             
             with col1:
@@ -716,12 +730,32 @@ else:
                 if referring_physician:
                     patient_info["Referring Physician"] = referring_physician
                 
-                pdf_data = create_pdf_report(
+                # Rebuilt only when the report, patient info or mode changes, so
+                # the native-resolution decode is not repeated on every rerun
+                source_data, source_key = st.session_state['report_source']
+                pdf_key = (
                     st.session_state['report_text'],
-                    st.session_state['report_image'],
                     st.session_state['report_type'],
-                    patient_info if patient_info else None
+                    tuple(patient_info.items()),
+                    compact_pdf,
+                    source_key
                 )
+                if st.session_state.get('report_pdf_key') != pdf_key:
+                    # Lossless output embeds the native-resolution image
+                    if compact_pdf:
+                        pdf_image = st.session_state['report_image']
+                    else:
+                        pdf_image = decode_image(source_data, key=source_key)
+                    
+                    st.session_state['report_pdf'] = create_pdf_report(
+                        st.session_state['report_text'],
+                        pdf_image,
+                        st.session_state['report_type'],
+                        patient_info if patient_info else None,
+                        compact=compact_pdf
+                    )
+                    st.session_state['report_pdf_key'] = pdf_key
+                pdf_data = st.session_state['report_pdf']
                 
                 if pdf_data:
                     st.download_button(
@@ -737,8 +771,53 @@ else:
                 if st.button("🔄 Clear Results", use_container_width=True):
                     del st.session_state['report_text']
                     del st.session_state['report_image']
+                    del st.session_state['report_source']
+                    st.session_state.pop('report_pdf', None)
+                    st.session_state.pop('report_pdf_key', None)
                     del st.session_state['report_type']
                     st.rerun()
+            
+            # Multi-study bundle: several reports in one PDF sharing fonts and resources
+            st.markdown("### 🗂️ Report Bundle")
+            if 'report_bundle' not in st.session_state:
+                st.session_state['report_bundle'] = []
+            bundle = st.session_state['report_bundle']
+            
+            col1, col2, col3 = st.columns([1, 1, 1])
+            
+            with col1:
+                if st.button("➕ Add to Bundle", use_container_width=True):
+                    bundle.append({
+                        'report_text': st.session_state['report_text'],
+                        'source': st.session_state['report_source'],
+                        'report_type': st.session_state['report_type'],
+                        'patient_info': patient_info if patient_info else None
+                    })
+                    st.success(f"✅ Added to bundle ({len(bundle)} studies)")
+            
+            with col2:
+                if bundle:
+                    # Built only on request and kept until the bundle or mode changes
+                    bundle_state = (len(bundle), compact_pdf)
+                    if st.session_state.get('bundle_pdf_state') != bundle_state:
+                        if st.button(f"🧩 Build Bundle ({len(bundle)})", use_container_width=True):
+                            st.session_state['bundle_pdf'] = create_pdf_bundle(bundle, compact=compact_pdf)
+                            st.session_state['bundle_pdf_state'] = bundle_state
+                    if st.session_state.get('bundle_pdf_state') == bundle_state and st.session_state.get('bundle_pdf'):
+                        st.download_button(
+                            label=f"📚 Download Bundle ({len(bundle)})",
+                            data=st.session_state['bundle_pdf'],
+                            file_name=f"report_bundle_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                            mime="application/pdf",
+                            use_container_width=True
+                        )
+            
+            with col3:
+                if bundle and st.button("🗑️ Clear Bundle", use_container_width=True):
+                    st.session_state['report_bundle'] = []
+                    st.session_state.pop('bundle_pdf', None)
+                    st.session_state.pop('bundle_pdf_state', None)
+                    st.rerun()
 
 # Footer
 st.markdown("---")
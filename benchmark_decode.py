@@ -0,0 +1,79 @@
+"""Compare per-rerun image cost of full decoding against the memoized decode layer.
+
+Usage:
+    python benchmark_decode.py [image ...] [--megapixels 20 50 100] [--reruns 5]
+
+Without image arguments synthetic grayscale JPEGs of the given sizes are
+generated. A "rerun" is what one Streamlit script run does with the upload:
+read its dimensions and encode the displayed image.
+"""
+import argparse
+import io
+import time
+import warnings
+from PIL import Image
+from image_decode import PREVIEW_MAX_SIDE, MODEL_MAX_SIDE, clear_decode_cache, decode_image, file_key, probe_image
+
+def synthetic_jpeg(megapixels):
+    """Return JPEG bytes of a noisy grayscale image with about that many megapixels"""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 30).convert('L').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def display(image):
+    """Encode the image the way st.image sends it to the browser"""
+    image.save(io.BytesIO(), format='JPEG')
+
+def full_decode_rerun(data):
+    """Old behaviour: open lazily, then display and read size at native resolution"""
+    image = Image.open(io.BytesIO(data))
+    display(image)
+    return image.size
+
+def layered_rerun(data, key):
+    """New behaviour: probe the header and display a memoized preview"""
+    info = probe_image(data)
+    display(decode_image(data, PREVIEW_MAX_SIDE, key=key))
+    return info.width, info.height
+
+def timed(function, *args):
+    """Return milliseconds taken by one call"""
+    start = time.perf_counter()
+    function(*args)
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='*', help="image files (default: synthetic JPEGs)")
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[20, 50, 100])
+    parser.add_argument('--reruns', type=int, default=5)
+    args = parser.parse_args()
+
+    # Large test inputs exceed Pillow's decompression bomb warning threshold
+    warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+    Image.MAX_IMAGE_PIXELS = None
+
+    if args.images:
+        inputs = []
+        for path in args.images:
+            with open(path, 'rb') as f:
+                inputs.append((path, f.read()))
+    else:
+        inputs = [(f"synthetic {mp:g} MP", synthetic_jpeg(mp)) for mp in args.megapixels]
+
+    print(f"{'input':<22}{'size':>13}{'full/rerun':>13}{'first run':>12}{'cached/rerun':>14}{'model decode':>14}")
+    for name, data in inputs:
+        clear_decode_cache()
+        info = probe_image(data)
+        key = file_key(data)
+        full = min(timed(full_decode_rerun, data) for _ in range(args.reruns))
+        first = timed(layered_rerun, data, key)
+        cached = min(timed(layered_rerun, data, key) for _ in range(args.reruns))
+        model = timed(decode_image, data, MODEL_MAX_SIDE, key)
+        print(f"{name:<22}{f'{info.width}x{info.height}':>13}{full:>11.0f}ms{first:>10.0f}ms"
+              f"{cached:>12.1f}ms{model:>12.0f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Report PDF file size and build time for standard, compact and bundled output.
+
+Usage:
+    python benchmark_pdf.py [image ...] [--repeat N]
+
+Without image arguments a synthetic 4000 x 3000 grayscale radiograph-like
+image is used.
+"""
+import argparse
+import time
+from PIL import Image, ImageDraw, ImageFilter
+from pdf_report import build_pdf_report, build_pdf_bundle
+
+SAMPLE_REPORT = """# Findings
+The lungs are clear bilaterally. No pleural effusion or pneumothorax.
+Cardiomediastinal silhouette is within normal limits.
+# Impression
+No acute cardiopulmonary abnormality.
+# Recommendations
+Clinical correlation as indicated."""
+
+def synthetic_image(width=4000, height=3000):
+    """Create a noisy grayscale test image with some structure"""
+    image = Image.effect_noise((width, height), 40).convert('L')
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        draw.ellipse([i * width // 30, i * height // 40, width - i * width // 30, height - i * height // 40],
+                     outline=80 + i * 12, width=25)
+    return image.filter(ImageFilter.GaussianBlur(2))
+
+def time_build(build, repeat):
+    """Return (bytes, best seconds) over repeated builds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = build()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return data, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('images', nargs='*', help="image files to embed (default: synthetic image)")
+    parser.add_argument('--repeat', type=int, default=3, help="builds per mode; the fastest is reported")
+    args = parser.parse_args()
+
+    if args.images:
+        images = [Image.open(path) for path in args.images]
+        for image in images:
+            image.load()
+    else:
+        images = [synthetic_image()]
+
+    reports = [
+        {'report_text': SAMPLE_REPORT, 'image': image, 'report_type': "X-ray Analysis"}
+        for image in images
+    ]
+
+    modes = {
+        'standard (PNG)': lambda: b''.join(
+            build_pdf_report(r['report_text'], r['image'], r['report_type'], compact=False) for r in reports),
+        'compact (JPEG)': lambda: b''.join(
+            build_pdf_report(r['report_text'], r['image'], r['report_type'], compact=True) for r in reports),
+        'bundle (compact)': lambda: build_pdf_bundle(reports, compact=True),
+    }
+
+    print(f"{len(images)} image(s): " + ", ".join(f"{i.size[0]}x{i.size[1]} {i.mode}" for i in images))
+    print(f"{'mode':<20}{'size (KB)':>12}{'build (ms)':>12}")
+    for name, build in modes.items():
+        data, seconds = time_build(build, args.repeat)
+        print(f"{name:<20}{len(data) / 1024:>12.1f}{seconds * 1000:>12.1f}")
+
+if __name__ == '__main__':
+    main()
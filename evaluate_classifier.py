@@ -0,0 +1,64 @@
+"""Measure accuracy and latency of the offline modality classifier on a labeled folder.
+
+Usage:
+    python evaluate_classifier.py DATASET [--model PATH] [--threshold 0.85]
+
+DATASET uses the same layout as for train_classifier.py. Images whose
+confidence falls below the threshold, or that fall outside the model's
+training range, would be sent to the remote model; the report shows how many
+that is and how accurate the remaining local answers are.
+"""
+import argparse
+import time
+import numpy as np
+from PIL import Image
+from modality_classifier import (CONFIDENCE_THRESHOLD, LABELS, MODEL_PATH, is_local_answer, load_labeled_folder,
+                                 load_model, predict_modality)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dataset', help="folder with one subfolder per modality")
+    parser.add_argument('--model', default=MODEL_PATH, help="model arrays to evaluate")
+    parser.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD,
+                        help="confidence below which the remote model is used")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    if model is None:
+        parser.error(f"no model found at {args.model}; run train_classifier.py first")
+    samples = load_labeled_folder(args.dataset)
+    if not samples:
+        parser.error(f"no labeled images found in {args.dataset}")
+
+    confusion = np.zeros((len(LABELS), len(LABELS)), dtype=int)
+    predict_ms, total_ms, confident, confident_correct, out_of_distribution = [], [], 0, 0, 0
+    for path, label in samples:
+        start = time.perf_counter()
+        with Image.open(path) as image:
+            prediction = predict_modality(image, model)
+        total_ms.append((time.perf_counter() - start) * 1000)
+        predict_ms.append(prediction.elapsed_ms)
+        confusion[LABELS.index(label), LABELS.index(prediction.label)] += 1
+        out_of_distribution += not prediction.in_distribution
+        if is_local_answer(prediction, args.threshold):
+            confident += 1
+            confident_correct += prediction.label == label
+
+    count = len(samples)
+    print(f"Images: {count}")
+    print(f"Accuracy (all):           {np.trace(confusion) / count:.1%}")
+    print(f"Answered locally:         {confident / count:.1%} (threshold {args.threshold:.2f})")
+    print(f"Out of distribution:      {out_of_distribution / count:.1%}")
+    if confident:
+        print(f"Accuracy (local answers): {confident_correct / confident:.1%}")
+    for name, values in (("predict", predict_ms), ("open+predict", total_ms)):
+        print(f"Latency {name:<13} mean {np.mean(values):.1f} ms, "
+              f"p50 {np.percentile(values, 50):.1f} ms, p95 {np.percentile(values, 95):.1f} ms")
+
+    print("\nConfusion matrix (rows = true, columns = predicted)")
+    print(" " * 12 + "".join(f"{label:>12}" for label in LABELS))
+    for label, row in zip(LABELS, confusion):
+        print(f"{label:>12}" + "".join(f"{value:>12}" for value in row))
+
+if __name__ == '__main__':
+    main()
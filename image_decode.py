@@ -0,0 +1,115 @@
+import io
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+from PIL import Image
+
+# Longest side used for each purpose; None means native resolution
+PREVIEW_MAX_SIDE = 1600
+MODEL_MAX_SIDE = 3072
+
+# Memory budget for decoded images, shared by all sessions of the process.
+# Decodes larger than DECODE_CACHE_MAX_ENTRY_BYTES (native-resolution
+# decodes of large studies) are returned without being cached
+DECODE_CACHE_BYTES = 512 * 1024 * 1024
+DECODE_CACHE_MAX_ENTRY_BYTES = 64 * 1024 * 1024
+
+ImageInfo = namedtuple("ImageInfo", ["width", "height", "format", "mode"])
+
+_decode_cache = OrderedDict()
+_decode_aliases = {}
+_decode_cache_bytes = 0
+_decode_lock = threading.Lock()
+
+def probe_image(data):
+    """Read dimensions and format from the file header without decoding pixels"""
+    with Image.open(io.BytesIO(data)) as image:
+        return ImageInfo(image.size[0], image.size[1], image.format, image.mode)
+
+def file_key(data):
+    """Return a short content digest identifying the file"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def image_nbytes(image):
+    """Approximate memory held by a decoded image"""
+    if image.mode in ('I', 'F'):
+        band_bytes = 4
+    elif image.mode.startswith('I;16'):
+        band_bytes = 2
+    else:
+        band_bytes = 1
+    return image.size[0] * image.size[1] * len(image.getbands()) * band_bytes
+
+def _cache_get(cache_key):
+    """Return a cached decode, following aliases; call with the lock held"""
+    cache_key = _decode_aliases.get(cache_key, cache_key)
+    entry = _decode_cache.get(cache_key)
+    if entry is None:
+        return None
+    _decode_cache.move_to_end(cache_key)
+    return entry[0]
+
+def _cache_put(cache_key, image):
+    """Store a decode and evict the oldest ones over budget; call with the lock held"""
+    global _decode_cache_bytes
+    size = image_nbytes(image)
+    if size > DECODE_CACHE_MAX_ENTRY_BYTES or cache_key in _decode_cache:
+        return
+    _decode_cache[cache_key] = (image, size)
+    _decode_cache_bytes += size
+    while _decode_cache_bytes > DECODE_CACHE_BYTES:
+        evicted_key, (_, evicted_size) = _decode_cache.popitem(last=False)
+        _decode_cache_bytes -= evicted_size
+        for alias in [a for a, target in _decode_aliases.items() if target == evicted_key]:
+            del _decode_aliases[alias]
+
+def _decode(data, max_side):
+    """Decode image bytes, scaling down so the longest side is at most max_side"""
+    image = Image.open(io.BytesIO(data))
+    if max_side is None:
+        image.load()
+        return image
+    # thumbnail() applies draft() first, so JPEGs are decoded directly at
+    # 1/2, 1/4 or 1/8 scale; other formats are shrunk with reduce() before
+    # the final Lanczos resample
+    image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=1.5)
+    return image
+
+def decode_image(data, max_side=None, key=None):
+    """Return the image decoded at the requested size, memoized per file and size.
+
+    The returned image is shared between callers and must not be modified in
+    place. `key` identifies the file; when omitted a digest of `data` is used.
+    """
+    key = key or file_key(data)
+    requested = (key, max_side)
+    with _decode_lock:
+        image = _cache_get(requested)
+    if image is not None:
+        return image
+
+    if max_side is not None:
+        width, height = probe_image(data)[:2]
+        if max(width, height) <= max_side:
+            # Requests at or above native size all share the full decode
+            max_side = None
+    normalized = (key, max_side)
+    if normalized != requested:
+        with _decode_lock:
+            _decode_aliases[requested] = normalized
+            image = _cache_get(normalized)
+        if image is not None:
+            return image
+
+    image = _decode(data, max_side)
+    with _decode_lock:
+        _cache_put(normalized, image)
+    return image
+
+def clear_decode_cache():
+    """Drop every memoized decode"""
+    global _decode_cache_bytes
+    with _decode_lock:
+        _decode_cache.clear()
+        _decode_aliases.clear()
+        _decode_cache_bytes = 0
@@ -0,0 +1,157 @@
+"""Generate a labeled folder of synthetic X-ray, CT, MRI and ultrasound phantoms.
+
+Usage:
+    python make_phantom_dataset.py OUTPUT [--per-class 200] [--seed 0]
+
+The phantoms reproduce the acquisition traits the offline classifier looks
+at: full-frame projection radiographs, axial CT slices inside a circular
+field of view, smooth MRI slices with a bias field and background noise, and
+speckled ultrasound sectors with overlay text and optional colour Doppler.
+Each image is randomly sized, windowed, blurred, noised and JPEG-compressed.
+The shipped model was trained with --seed 0 and evaluated on --seed 1.
+"""
+import argparse
+import os
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+def ellipse(draw, cx, cy, rx, ry, **kwargs):
+    """Draw an ellipse given its centre and radii"""
+    draw.ellipse([cx - rx, cy - ry, cx + rx, cy + ry], **kwargs)
+
+def xray(rng):
+    """Projection radiograph: bright body filling most of the frame"""
+    width = int(rng.integers(400, 640))
+    height = int(width * rng.uniform(0.8, 1.3))
+    image = Image.new('L', (width, height), int(rng.integers(0, 60)))
+    draw = ImageDraw.Draw(image)
+    margin = rng.uniform(-0.1, 0.1)
+    ellipse(draw, width / 2, height / 2, width * (0.55 + margin), height * (0.6 + margin),
+            fill=int(rng.integers(110, 170)))
+    if rng.random() < 0.7:
+        # Chest: dark lungs, ribs and a bright spine
+        for side in (-1, 1):
+            ellipse(draw, width / 2 + side * width * 0.2, height * 0.45, width * 0.15, height * 0.28,
+                    fill=int(rng.integers(30, 80)))
+        for i in range(8):
+            y = height * (0.22 + i * 0.07)
+            draw.arc([width * 0.1, y - height * 0.05, width * 0.9, y + height * 0.1], 200, 340,
+                     fill=int(rng.integers(150, 210)), width=max(2, width // 80))
+        draw.rectangle([width * 0.47, 0, width * 0.53, height], fill=int(rng.integers(170, 230)))
+    else:
+        # Limb: long bones
+        for offset in (-0.08, 0.08):
+            draw.rectangle([width * (0.45 + offset), height * 0.05, width * (0.52 + offset), height * 0.95],
+                           fill=int(rng.integers(190, 250)))
+    if rng.random() < 0.5:
+        draw.text((int(width * 0.05), int(height * 0.05)), rng.choice(["L", "R", "PA", "AP"]), fill=255)
+    return image.filter(ImageFilter.GaussianBlur(rng.uniform(2, 6)))
+
+def ct(rng):
+    """Axial CT slice: body and bone rings inside a circular field of view"""
+    size = int(rng.choice([256, 384, 512]))
+    image = Image.new('L', (size, size), 0)
+    draw = ImageDraw.Draw(image)
+    if rng.random() < 0.7:
+        ellipse(draw, size / 2, size / 2, size * 0.49, size * 0.49, fill=int(rng.integers(10, 40)))
+    if rng.random() < 0.5:
+        # Head: bright skull around grey brain
+        r = size * rng.uniform(0.3, 0.42)
+        ellipse(draw, size / 2, size / 2, r, r * 1.15, fill=int(rng.integers(220, 255)))
+        ellipse(draw, size / 2, size / 2, r * 0.9, r * 1.05, fill=int(rng.integers(90, 130)))
+        ellipse(draw, size / 2, size / 2, r * 0.15, r * 0.3, fill=int(rng.integers(40, 70)))
+    else:
+        # Body: fat ring, soft tissue, organs and a vertebra
+        rx, ry = size * rng.uniform(0.35, 0.46), size * rng.uniform(0.25, 0.36)
+        ellipse(draw, size / 2, size / 2, rx, ry, fill=int(rng.integers(60, 90)))
+        ellipse(draw, size / 2, size / 2, rx * 0.9, ry * 0.88, fill=int(rng.integers(110, 140)))
+        for _ in range(int(rng.integers(2, 6))):
+            ellipse(draw, size / 2 + rng.uniform(-rx, rx) * 0.5, size / 2 + rng.uniform(-ry, ry) * 0.4,
+                    size * rng.uniform(0.04, 0.12), size * rng.uniform(0.04, 0.1), fill=int(rng.integers(90, 170)))
+        ellipse(draw, size / 2, size / 2 + ry * 0.6, size * 0.05, size * 0.05, fill=int(rng.integers(220, 255)))
+        draw.rectangle([size * 0.1, size / 2 + ry + 8, size * 0.9, size / 2 + ry + 14], fill=int(rng.integers(80, 150)))
+    return image.filter(ImageFilter.GaussianBlur(rng.uniform(0.5, 1.5)))
+
+def mri(rng):
+    """MRI slice: smooth tissue with a bias field and noisy dark background"""
+    size = int(rng.choice([256, 320, 384, 512]))
+    width, height = size, int(size * rng.choice([1.0, 1.0, 1.17, 0.86]))
+    image = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(image)
+    cx, cy = width * rng.uniform(0.42, 0.58), height * rng.uniform(0.42, 0.58)
+    rx, ry = width * rng.uniform(0.3, 0.45), height * rng.uniform(0.3, 0.45)
+    ellipse(draw, cx, cy, rx, ry, fill=int(rng.integers(150, 230)))
+    ellipse(draw, cx, cy, rx * 0.92, ry * 0.92, fill=int(rng.integers(70, 140)))
+    for _ in range(int(rng.integers(4, 12))):
+        ellipse(draw, cx + rng.uniform(-rx, rx) * 0.6, cy + rng.uniform(-ry, ry) * 0.6,
+                rx * rng.uniform(0.05, 0.3), ry * rng.uniform(0.05, 0.3), fill=int(rng.integers(30, 250)))
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(1.5, 3.5)))
+    pixels = np.asarray(image, dtype=np.float32)
+    y, x = np.mgrid[:height, :width]
+    bias = 1 + rng.uniform(-0.3, 0.3) * (x / width - 0.5) + rng.uniform(-0.3, 0.3) * (y / height - 0.5)
+    pixels = pixels * bias + np.abs(rng.normal(0, rng.uniform(2, 8), pixels.shape))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+def ultrasound(rng):
+    """Ultrasound frame: speckled sector or linear field on black with overlays"""
+    width = int(rng.integers(480, 800))
+    height = int(width * rng.uniform(0.7, 0.8))
+    field = Image.new('L', (width, height), 0)
+    draw = ImageDraw.Draw(field)
+    if rng.random() < 0.75:
+        spread = rng.uniform(25, 45)
+        radius = height * rng.uniform(0.85, 1.0)
+        apex = (width / 2, height * 0.08)
+        draw.pieslice([apex[0] - radius, apex[1] - radius, apex[0] + radius, apex[1] + radius],
+                      90 - spread, 90 + spread, fill=255)
+    else:
+        draw.rectangle([width * 0.25, height * 0.08, width * 0.75, height * 0.95], fill=255)
+    mask = np.asarray(field, dtype=np.float32) / 255
+    speckle = rng.rayleigh(rng.uniform(40, 70), (height, width))
+    tissue = np.asarray(Image.fromarray(np.clip(speckle, 0, 255).astype(np.uint8))
+                        .filter(ImageFilter.GaussianBlur(rng.uniform(0.5, 1.2))), dtype=np.float32)
+    y = np.arange(height)[:, None] / height
+    pixels = tissue * mask * (1.1 - rng.uniform(0.2, 0.6) * y)
+    for _ in range(int(rng.integers(0, 3))):
+        cx, cy = rng.uniform(0.35, 0.65) * width, rng.uniform(0.35, 0.8) * height
+        r = rng.uniform(0.03, 0.1) * width
+        yy, xx = np.ogrid[:height, :width]
+        pixels[(xx - cx) ** 2 + (yy - cy) ** 2 < r ** 2] *= 0.15
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    draw.text((10, 10), "5C1 ABD  GN 52  D 16cm", fill=(220, 220, 220))
+    draw.line([width - 20, height * 0.1, width - 20, height * 0.9], fill=(200, 200, 200), width=2)
+    if rng.random() < 0.3:
+        # Colour Doppler box
+        cx, cy = int(width * rng.uniform(0.4, 0.6)), int(height * rng.uniform(0.4, 0.6))
+        draw.ellipse([cx - 20, cy - 10, cx + 20, cy + 10], fill=(200, 30, 30))
+        draw.ellipse([cx - 10, cy + 10, cx + 25, cy + 25], fill=(30, 60, 200))
+    return image
+
+GENERATORS = {"xray": xray, "ct": ct, "mri": mri, "ultrasound": ultrasound}
+
+def augment(image, rng):
+    """Random windowing, noise and JPEG compression"""
+    pixels = np.asarray(image, dtype=np.float32) / 255
+    pixels = pixels ** rng.uniform(0.7, 1.4) * rng.uniform(0.85, 1.15)
+    pixels = pixels + rng.normal(0, rng.uniform(0, 0.02), pixels.shape)
+    return Image.fromarray(np.clip(pixels * 255, 0, 255).astype(np.uint8))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="folder to create the labeled subfolders in")
+    parser.add_argument('--per-class', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    for folder, generate in GENERATORS.items():
+        directory = os.path.join(args.output, folder)
+        os.makedirs(directory, exist_ok=True)
+        for index in range(args.per_class):
+            image = augment(generate(rng), rng)
+            image.save(os.path.join(directory, f"{folder}_{index:04d}.jpg"), quality=int(rng.integers(60, 95)))
+    print(f"Wrote {args.per_class * len(GENERATORS)} images to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+import os
+import time
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+from pdf_report import to_8bit
+
+# Labels match the categories used in the classification prompt
+LABELS = ("X-ray", "CT Scan", "MRI Scan", "Ultrasound")
+
+# Folder names accepted for each label when loading a labeled dataset
+FOLDER_ALIASES = {
+    "xray": "X-ray", "x-ray": "X-ray", "x_ray": "X-ray", "cr": "X-ray", "dx": "X-ray",
+    "ct": "CT Scan", "ct scan": "CT Scan", "ct_scan": "CT Scan",
+    "mri": "MRI Scan", "mr": "MRI Scan", "mri scan": "MRI Scan", "mri_scan": "MRI Scan",
+    "ultrasound": "Ultrasound", "us": "Ultrasound",
+}
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "modality_classifier.npz")
+
+# Side length images are resampled to before feature extraction
+FEATURE_SIZE = 128
+
+# Predictions below this confidence are sent to the remote model instead
+CONFIDENCE_THRESHOLD = 0.85
+
+# Out-of-distribution gate: inputs smaller than MIN_IMAGE_SIDE, nearly flat
+# (grey-level std below MIN_GRAY_STD), with any standardized feature more
+# than OOD_MARGIN stds outside the training range, or further from the
+# training mean than OOD_DISTANCE_FACTOR x the furthest training sample are
+# never answered locally, however confident the softmax is
+MIN_IMAGE_SIDE = 64
+MIN_GRAY_STD = 4.0
+OOD_MARGIN = 1.0
+OOD_DISTANCE_FACTOR = 1.25
+
+ModalityPrediction = namedtuple(
+    "ModalityPrediction", ["label", "confidence", "probabilities", "elapsed_ms", "in_distribution"]
+)
+
+def image_to_arrays(image, size=FEATURE_SIZE):
+    """Return (gray, rgb) float arrays of the image resampled to size x size"""
+    if image.mode in ('1', 'P'):
+        image = image.convert('RGB')
+    small = to_8bit(image.resize((size, size), Image.BILINEAR, reducing_gap=2.0))
+    rgb = np.asarray(small.convert('RGB'), dtype=np.float32)
+    gray = np.asarray(small.convert('L'), dtype=np.float32)
+    return gray, rgb
+
+def sector_features(mask):
+    """Describe how fan-shaped the foreground is (ultrasound sector scans)"""
+    widths = mask.mean(axis=1)
+    rows = np.nonzero(widths > 0.02)[0]
+    if len(rows) < 8 or widths[rows].std() == 0:
+        return 0.0, 0.0
+    # Foreground width grows steadily from the apex of the fan downwards
+    growth = float(np.corrcoef(rows, widths[rows])[0, 1])
+    quarter = max(1, len(rows) // 4)
+    top = widths[rows[:quarter]].mean()
+    bottom = widths[rows[-quarter:]].mean()
+    return growth, float(1.0 - top / bottom) if bottom > 0 else 0.0
+
+def circular_fov_features(mask):
+    """Describe how well the foreground fits a centred circular field of view (CT)"""
+    size = mask.shape[0]
+    y, x = np.ogrid[:size, :size]
+    centre = (size - 1) / 2.0
+    inside = (x - centre) ** 2 + (y - centre) ** 2 <= (size / 2.0) ** 2
+    corner = max(1, size // 8)
+    corners = np.concatenate([
+        mask[:corner, :corner].ravel(), mask[:corner, -corner:].ravel(),
+        mask[-corner:, :corner].ravel(), mask[-corner:, -corner:].ravel(),
+    ])
+    return float(mask[inside].mean() - mask[~inside].mean()), float(1.0 - corners.mean())
+
+def extract_features(image, arrays=None):
+    """Return the feature vector used by the local classifier"""
+    gray, rgb = arrays if arrays is not None else image_to_arrays(image)
+    mask = gray > 20
+
+    histogram = np.histogram(gray, bins=16, range=(0, 256))[0] / gray.size
+    width, height = image.size
+    colourfulness = (np.abs(rgb[..., 0] - rgb[..., 1]) + np.abs(rgb[..., 1] - rgb[..., 2])).mean() / 255.0
+    gradient = (np.abs(np.diff(gray, axis=0)).mean() + np.abs(np.diff(gray, axis=1)).mean()) / 255.0
+    mirrored = gray[:, ::-1]
+    symmetry = float(np.corrcoef(gray.ravel(), mirrored.ravel())[0, 1]) if gray.std() > 0 else 1.0
+
+    return np.concatenate([
+        histogram,
+        [
+            np.log(width / height),
+            gray.mean() / 255.0,
+            gray.std() / 255.0,
+            (gray < 10).mean(),
+            (gray > 245).mean(),
+            colourfulness,
+            gradient,
+            symmetry,
+        ],
+        sector_features(mask),
+        circular_fov_features(mask),
+    ]).astype(np.float32)
+
+def softmax(logits):
+    """Row-wise softmax"""
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+def train_model(features, labels, epochs=2000, learning_rate=0.5, l2=1e-3):
+    """Fit a softmax regression model; returns a dict of arrays ready for save_model"""
+    features = np.asarray(features, dtype=np.float32)
+    targets = np.eye(len(LABELS), dtype=np.float32)[[LABELS.index(label) for label in labels]]
+    mean = features.mean(axis=0)
+    std = features.std(axis=0) + 1e-6
+    x = (features - mean) / std
+    weights = np.zeros((x.shape[1], len(LABELS)), dtype=np.float32)
+    bias = np.zeros(len(LABELS), dtype=np.float32)
+    for _ in range(epochs):
+        error = softmax(x @ weights + bias) - targets
+        weights -= learning_rate * (x.T @ error / len(x) + l2 * weights)
+        bias -= learning_rate * error.mean(axis=0)
+    # Training range kept for the out-of-distribution gate
+    distance = np.sqrt((x ** 2).mean(axis=1))
+    return {
+        "weights": weights, "bias": bias, "mean": mean, "std": std, "labels": np.array(LABELS),
+        "z_min": x.min(axis=0), "z_max": x.max(axis=0), "max_distance": np.float32(distance.max()),
+    }
+
+def save_model(model, path=MODEL_PATH):
+    """Write model arrays to an .npz file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **model)
+
+@lru_cache(maxsize=4)
+def load_model(path=MODEL_PATH):
+    """Load model arrays from disk, or return None if no model has been trained"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        model = {key: data[key] for key in data.files}
+    if tuple(model["labels"]) != LABELS:
+        raise ValueError(f"Model labels {tuple(model['labels'])} do not match {LABELS}")
+    return model
+
+def in_training_range(x, model):
+    """Whether standardized features lie within the range the model was trained on"""
+    if "z_min" not in model:
+        # Models saved without their training range cannot be trusted on any input
+        return False
+    if np.any(x < model["z_min"] - OOD_MARGIN) or np.any(x > model["z_max"] + OOD_MARGIN):
+        return False
+    return float(np.sqrt((x ** 2).mean())) <= OOD_DISTANCE_FACTOR * float(model["max_distance"])
+
+def predict_modality(image, model=None):
+    """Classify the imaging modality locally; returns None if no model is available.
+
+    Check `in_distribution` as well as `confidence` before trusting the label.
+    """
+    model = model if model is not None else load_model()
+    if model is None:
+        return None
+    start = time.perf_counter()
+    arrays = image_to_arrays(image)
+    x = (extract_features(image, arrays) - model["mean"]) / model["std"]
+    probabilities = softmax(x @ model["weights"] + model["bias"])
+    best = int(probabilities.argmax())
+    degenerate = min(image.size) < MIN_IMAGE_SIDE or arrays[0].std() < MIN_GRAY_STD
+    return ModalityPrediction(
+        LABELS[best],
+        float(probabilities[best]),
+        dict(zip(LABELS, probabilities.tolist())),
+        (time.perf_counter() - start) * 1000,
+        not degenerate and in_training_range(x, model)
+    )
+
+def is_local_answer(prediction, threshold=CONFIDENCE_THRESHOLD):
+    """Whether a prediction may be shown without asking the remote model"""
+    return prediction is not None and prediction.in_distribution and prediction.confidence >= threshold
+
+def load_labeled_folder(root):
+    """Return [(path, label)] for images in label-named subfolders of root"""
+    samples = []
+    for folder in sorted(os.listdir(root)):
+        label = FOLDER_ALIASES.get(folder.lower())
+        directory = os.path.join(root, folder)
+        if label is None or not os.path.isdir(directory):
+            continue
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    samples.append((os.path.join(dirpath, filename), label))
+    return samples
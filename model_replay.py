@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+# Backend selection for the app: live, record or replay
+BACKEND_ENV = "MODEL_BACKEND"
+LOG_ENV = "MODEL_LOG"
+TIME_SCALE_ENV = "REPLAY_TIME_SCALE"
+DEFAULT_LOG_PATH = "model_log.jsonl.gz"
+
+def request_fingerprint(prompt, image):
+    """Return a digest identifying a model request by its prompt and pixels"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(prompt.encode('utf-8'))
+    if image is not None:
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode('ascii'))
+        digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def read_log(path):
+    """Return every recorded entry in the log, oldest first"""
+    entries = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+class LiveBackend:
+    """Calls the Gemini model directly"""
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate(self, prompt, image, tags=None):
+        """Return the model's response text"""
+        return self.model.generate_content([prompt, image]).text
+
+class RecordingBackend:
+    """Wraps another backend and appends each request and response to a gzip JSON-lines log"""
+
+    def __init__(self, inner, path=DEFAULT_LOG_PATH):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, image, tags=None):
+        """Call the wrapped backend and record fingerprint, timing and response"""
+        entry = {
+            't': time.time(),
+            'fp': request_fingerprint(prompt, image),
+            'prompt_chars': len(prompt),
+            'image': [image.size[0], image.size[1], image.mode] if image is not None else None,
+            'tags': tags or {},
+        }
+        start = time.perf_counter()
+        try:
+            text = self.inner.generate(prompt, image, tags)
+            entry['response'] = text
+            return text
+        except Exception as e:
+            entry['error'] = str(e)
+            raise
+        finally:
+            entry['latency'] = time.perf_counter() - start
+            self._append(entry)
+
+    def _append(self, entry):
+        """Write one entry; each write is its own gzip member so the log stays appendable"""
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(line)
+
+class ReplayBackend:
+    """Serves recorded responses deterministically, with optional time-scaled latency.
+
+    Requests are matched by fingerprint; repeated requests with the same
+    fingerprint get the recorded responses in order, cycling when exhausted.
+    A time_scale of 10 replays latencies 10x faster; 0 or None skips the delay.
+    """
+
+    def __init__(self, path=DEFAULT_LOG_PATH, time_scale=1.0):
+        self.entries = read_log(path)
+        self.time_scale = time_scale
+        self._by_fingerprint = defaultdict(deque)
+        for entry in self.entries:
+            self._by_fingerprint[entry['fp']].append(entry)
+        self._lock = threading.Lock()
+
+    def lookup(self, fingerprint):
+        """Return the next recorded entry for the fingerprint"""
+        with self._lock:
+            queue = self._by_fingerprint.get(fingerprint)
+            if not queue:
+                raise KeyError(f"No recorded response for request {fingerprint}")
+            entry = queue[0]
+            queue.rotate(-1)
+            return entry
+
+    def respond(self, entry):
+        """Wait for the entry's scaled latency, then return its response or raise its error"""
+        if self.time_scale:
+            time.sleep(entry['latency'] / self.time_scale)
+        if 'error' in entry:
+            raise RuntimeError(entry['error'])
+        return entry['response']
+
+    def generate(self, prompt, image, tags=None):
+        """Return the recorded response for an identical request"""
+        return self.respond(self.lookup(request_fingerprint(prompt, image)))
+
+def create_backend(model):
+    """Build the backend selected by the MODEL_BACKEND environment variable"""
+    mode = os.environ.get(BACKEND_ENV, 'live').lower()
+    path = os.environ.get(LOG_ENV, DEFAULT_LOG_PATH)
+    if mode == 'live':
+        return LiveBackend(model)
+    if mode == 'record':
+        return RecordingBackend(LiveBackend(model), path)
+    if mode == 'replay':
+        return ReplayBackend(path, float(os.environ.get(TIME_SCALE_ENV, '1.0')))
+    raise ValueError(f"Unknown {BACKEND_ENV} '{mode}'; expected live, record or replay")
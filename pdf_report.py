@@ -0,0 +1,183 @@
+import io
+from datetime import datetime
+from functools import lru_cache
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, PageBreak
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.colors import HexColor
+
+# Box the analyzed image is fitted into on the page (points)
+IMAGE_MAX_WIDTH = 4 * inch
+IMAGE_MAX_HEIGHT = 3 * inch
+
+# Compact mode settings
+PRINT_DPI = 150
+JPEG_QUALITY = 85
+
+DISCLAIMER_TEXT = (
+    "<b>⚠️ IMPORTANT DISCLAIMER:</b> This report is generated by AI and is for preliminary analysis only. "
+    "All findings must be reviewed and validated by a qualified healthcare professional before making "
+    "any clinical decisions."
+)
+
+# Styles are built once per process and shared by every report
+@lru_cache(maxsize=1)
+def get_report_styles():
+    """Return the paragraph styles used in PDF reports"""
+    styles = getSampleStyleSheet()
+    return {
+        'normal': styles['Normal'],
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=HexColor('#1e3a8a'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=HexColor('#667eea'),
+            spaceAfter=12,
+            spaceBefore=12,
+            fontName='Helvetica-Bold'
+        ),
+        'disclaimer': ParagraphStyle(
+            'Disclaimer',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=HexColor('#dc2626'),
+            borderColor=HexColor('#dc2626'),
+            borderWidth=1,
+            borderPadding=10,
+            backColor=HexColor('#fef2f2')
+        ),
+    }
+
+def fit_image_size(width, height, max_width=IMAGE_MAX_WIDTH, max_height=IMAGE_MAX_HEIGHT):
+    """Return the drawn size (points) of an image fitted into the box, keeping its aspect ratio"""
+    scale = min(max_width / width, max_height / height)
+    return width * scale, height * scale
+
+def to_8bit(image):
+    """Convert any PIL image mode to L or RGB so it can be saved as JPEG"""
+    if image.mode in ('L', 'RGB'):
+        return image
+    if image.mode in ('1', 'CMYK', 'YCbCr'):
+        return image.convert('RGB' if image.mode != '1' else 'L')
+    if image.mode in ('I', 'F') or image.mode.startswith('I;16'):
+        # Stretch the stored value range to 0-255 instead of clipping it
+        image = image.convert('F')
+        low, high = image.getextrema()
+        scale = 255.0 / (high - low) if high > low else 1.0
+        return image.point(lambda v: (v - low) * scale).convert('L')
+    if image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info):
+        # Flatten transparency onto a white page background
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+def prepare_report_image(image, compact=False, dpi=PRINT_DPI, quality=JPEG_QUALITY):
+    """Encode an image for embedding; returns (buffer, draw_width, draw_height)"""
+    draw_width, draw_height = fit_image_size(*image.size)
+    buffer = io.BytesIO()
+    if compact:
+        # Resample to the pixel count actually printed, never upsampling
+        target = (max(1, round(draw_width / inch * dpi)), max(1, round(draw_height / inch * dpi)))
+        if target[0] < image.size[0]:
+            # Palette and bilevel images only support NEAREST resampling
+            if image.mode in ('1', 'P'):
+                image = to_8bit(image)
+            image = image.resize(target, Image.LANCZOS)
+        to_8bit(image).save(buffer, format='JPEG', quality=quality, optimize=True)
+    else:
+        image.save(buffer, format='PNG')
+    buffer.seek(0)
+    return buffer, draw_width, draw_height
+
+def build_report_story(report_text, image, report_type, patient_info=None, compact=False):
+    """Build the list of flowables for a single report"""
+    styles = get_report_styles()
+    story = []
+
+    # Title
+    story.append(Paragraph("🏥 MEDICAL IMAGING ANALYSIS REPORT", styles['title']))
+    story.append(Spacer(1, 0.3*inch))
+
+    # Report Information
+    story.append(Paragraph(f"<b>Report Type:</b> {report_type}", styles['normal']))
+    story.append(Paragraph(f"<b>Date Generated:</b> {datetime.now().strftime('%B %d, %Y at %I:%M %p')}", styles['normal']))
+    story.append(Spacer(1, 0.2*inch))
+
+    # Add patient info if provided
+    if patient_info:
+        story.append(Paragraph("PATIENT INFORMATION", styles['heading']))
+        for key, value in patient_info.items():
+            story.append(Paragraph(f"<b>{key}:</b> {value}", styles['normal']))
+        story.append(Spacer(1, 0.2*inch))
+
+    # Add image if available
+    if image:
+        try:
+            buffer, draw_width, draw_height = prepare_report_image(image, compact=compact)
+            story.append(Paragraph("ANALYZED IMAGE", styles['heading']))
+            story.append(RLImage(buffer, width=draw_width, height=draw_height))
+            story.append(Spacer(1, 0.3*inch))
+        except Exception as e:
+            print(f"Could not add image to PDF: {e}")
+
+    # Add report content
+    story.append(Paragraph("ANALYSIS REPORT", styles['heading']))
+    story.append(Spacer(1, 0.1*inch))
+
+    # Process report text
+    for line in report_text.split('\n'):
+        if line.strip():
+            if line.startswith('#'):
+                story.append(Paragraph(line.replace('#', '').strip(), styles['heading']))
+            else:
+                story.append(Paragraph(line, styles['normal']))
+            story.append(Spacer(1, 0.1*inch))
+
+    # Disclaimer
+    story.append(Spacer(1, 0.3*inch))
+    story.append(Paragraph(DISCLAIMER_TEXT, styles['disclaimer']))
+    return story
+
+def build_pdf(story):
+    """Render flowables to PDF bytes in memory"""
+    output = io.BytesIO()
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    doc.build(story)
+    return output.getvalue()
+
+def build_pdf_report(report_text, image, report_type, patient_info=None, compact=False):
+    """Create a single-study PDF report and return its bytes"""
+    return build_pdf(build_report_story(report_text, image, report_type, patient_info, compact))
+
+def build_pdf_bundle(reports, compact=False):
+    """Create one PDF holding several studies, one per page group, sharing fonts and resources.
+
+    `reports` is a list of dicts with keys report_text, image, report_type and
+    optionally patient_info.
+    """
+    story = []
+    for index, report in enumerate(reports):
+        if index:
+            story.append(PageBreak())
+        story.extend(build_report_story(
+            report['report_text'],
+            report.get('image'),
+            report['report_type'],
+            report.get('patient_info'),
+            compact
+        ))
+    return build_pdf(story)
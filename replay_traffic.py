@@ -0,0 +1,205 @@
+"""Re-run recorded model traffic through the rest of the pipeline without network access.
+
+Usage:
+    python replay_traffic.py model_log.jsonl.gz [--speed 10] [--output DIR]
+
+Each recorded request is re-issued at its original arrival offset (when the
+user asked, before any queueing) divided by --speed. It goes through the same stages as in the app: header probe plus
+preview and model decodes of a synthetic upload with the recorded source
+dimensions, format and mode, queueing in the report scheduler, the replayed
+model call (latency also divided by --speed), compact PDF building and
+writing the PDF to disk. Per-stage timings and overall throughput show where
+the pipeline saturates.
+"""
+import argparse
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from PIL import Image
+from image_decode import PREVIEW_MAX_SIDE, MODEL_MAX_SIDE, decode_image, probe_image
+from model_replay import ReplayBackend
+from pdf_report import build_pdf_report
+from report_scheduler import PRIORITIES, QueueFull, ReportScheduler
+
+STAGES = ("decode", "queue", "model", "pdf", "storage")
+
+def arrival_time(entry):
+    """When the user made the request; older logs only hold when the model was called"""
+    return (entry.get('tags') or {}).get('arrived_at') or entry['t']
+
+def source_spec(entry):
+    """Return (width, height, format, mode) of the upload behind a recorded request"""
+    source = (entry.get('tags') or {}).get('source')
+    if source:
+        return source['width'], source['height'], source.get('format') or 'JPEG', source.get('mode') or 'L'
+    if entry.get('image'):
+        # Older logs only hold the size of the image sent to the model
+        width, height, mode = entry['image']
+        return width, height, 'JPEG', mode
+    return None
+
+def source_image(width, height, file_format, mode):
+    """Return file bytes standing in for an upload of the recorded size and format"""
+    image = Image.effect_noise((width, height), 30).convert('L')
+    if mode == 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    if file_format == 'PNG':
+        image.save(buffer, format='PNG')
+    else:
+        image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+class Timings:
+    """Thread-safe collection of per-stage durations"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def error(self, kind):
+        """Count one failed request"""
+        with self._lock:
+            self.errors[kind] += 1
+
+    def complete(self):
+        """Count one request that went through every stage"""
+        with self._lock:
+            self.completed += 1
+
+def run_request(index, entry, sources, backend, scheduler, timings, output_dir):
+    """Push one recorded request through every pipeline stage"""
+    tags = entry.get('tags') or {}
+    priority = tags.get('priority') if tags.get('priority') in PRIORITIES else "Routine"
+
+    start = time.perf_counter()
+    image = None
+    spec = source_spec(entry)
+    if spec:
+        # Same work as the app per upload; a unique key per request so each
+        # one pays for its own decodes
+        data = sources[spec]
+        probe_image(data)
+        decode_image(data, PREVIEW_MAX_SIDE, key=f"replay-{index}")
+        image = decode_image(data, MODEL_MAX_SIDE, key=f"replay-{index}")
+    timings.add("decode", time.perf_counter() - start)
+
+    try:
+        ticket = scheduler.submit(priority, user=tags.get('user'), modality=tags.get('modality'))
+    except QueueFull:
+        timings.error("rejected")
+        return
+    try:
+        start = time.perf_counter()
+        scheduler.wait(ticket)
+        timings.add("queue", time.perf_counter() - start)
+        start = time.perf_counter()
+        try:
+            text = backend.respond(entry)
+        except RuntimeError:
+            timings.error("model error")
+            return
+        finally:
+            timings.add("model", time.perf_counter() - start)
+    finally:
+        scheduler.release(ticket)
+
+    start = time.perf_counter()
+    try:
+        pdf_data = build_pdf_report(text, image, tags.get('modality') or "Replay", compact=True)
+    except Exception:
+        timings.error("pdf error")
+        return
+    finally:
+        timings.add("pdf", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        with open(os.path.join(output_dir, f"report_{index:06d}.pdf"), 'wb') as f:
+            f.write(pdf_data)
+    except OSError:
+        timings.error("storage error")
+        return
+    finally:
+        timings.add("storage", time.perf_counter() - start)
+    timings.complete()
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list"""
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('log', help="log written with MODEL_BACKEND=record")
+    parser.add_argument('--speed', type=float, default=10.0, help="time compression factor")
+    parser.add_argument('--output', help="directory for generated PDFs (default: a temporary directory)")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    args = parser.parse_args()
+
+    backend = ReplayBackend(args.log, time_scale=args.speed)
+    entries = sorted(backend.entries, key=arrival_time)
+    entries = entries[:args.limit] if args.limit else entries
+    if not entries:
+        parser.error(f"no entries in {args.log}")
+    output_dir = args.output or tempfile.mkdtemp(prefix="replay_")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Source files are generated up front so they are not part of the timings
+    sources = {}
+    recorded_bytes = synthetic_bytes = 0
+    for entry in entries:
+        spec = source_spec(entry)
+        if spec is None:
+            continue
+        if spec not in sources:
+            sources[spec] = source_image(*spec)
+        synthetic_bytes += len(sources[spec])
+        recorded_bytes += ((entry.get('tags') or {}).get('source') or {}).get('bytes') or len(sources[spec])
+    if sources:
+        largest = max(sources, key=lambda spec: spec[0] * spec[1])
+        print(f"Synthetic uploads: {len(sources)} distinct sizes, largest {largest[0]}x{largest[1]} {largest[2]}, "
+              f"{synthetic_bytes / 1e6:.0f} MB vs {recorded_bytes / 1e6:.0f} MB recorded")
+
+    scheduler = ReportScheduler()
+    timings = Timings()
+    threads = []
+    origin = arrival_time(entries[0])
+    start = time.monotonic()
+    for index, entry in enumerate(entries):
+        delay = start + (arrival_time(entry) - origin) / args.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=run_request, args=(
+            index, entry, sources, backend, scheduler, timings, output_dir))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    recorded_span = arrival_time(entries[-1]) - origin
+    completed = timings.completed
+    print(f"Replayed {len(entries)} requests ({recorded_span:.0f}s recorded) at {args.speed:g}x in {elapsed:.1f}s")
+    print(f"Completed {completed}, throughput {completed / elapsed:.2f} reports/s, PDFs in {output_dir}")
+    for kind, count in timings.errors.items():
+        print(f"{kind}: {count}")
+    print(f"{'stage':<10}{'count':>8}{'mean':>12}{'p95':>12}{'max':>12}")
+    for stage in STAGES:
+        values = timings.samples[stage]
+        if values:
+            print(f"{stage:<10}{len(values):>8}{sum(values) / len(values) * 1000:>10.1f}ms"
+                  f"{percentile(values, 0.95) * 1000:>10.1f}ms{max(values) * 1000:>10.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+# Priority classes, most urgent first
+PRIORITIES = ("STAT", "Urgent", "Routine")
+
+# Model calls allowed in flight at once across all sessions
+MODEL_CONCURRENCY = 4
+
+# Slots only STAT work may use, so a STAT request never waits behind a full
+# set of routine calls for longer than one model call
+RESERVED_STAT_SLOTS = 1
+
+# Running calls allowed per user and per modality (STAT ignores the modality cap).
+# The app identifies users by referring physician; requests without one are
+# not subject to the per-user cap
+PER_USER_LIMIT = 2
+PER_MODALITY_LIMIT = 3
+
+# Queue depth at which new requests of a class are turned away; None = never
+QUEUE_LIMITS = {"STAT": None, "Urgent": 24, "Routine": 12}
+
+# Starting estimate of one model call, refined as calls complete
+INITIAL_SERVICE_SECONDS = 10.0
+
+# How long a caller waits for a slot before giving up: a multiple of the
+# expected wait, kept within these bounds
+WAIT_TIMEOUT_FACTOR = 3.0
+MIN_WAIT_TIMEOUT = 30.0
+MAX_WAIT_TIMEOUT = 300.0
+
+class QueueFull(Exception):
+    """Raised when a request is refused because the queue is too deep"""
+
+    def __init__(self, priority, depth, retry_after):
+        super().__init__(f"{priority} queue is full ({depth} waiting); retry in about {retry_after:.0f}s")
+        self.priority = priority
+        self.depth = depth
+        self.retry_after = retry_after
+
+def wait_timeout(expected_wait):
+    """Seconds to wait for a slot given the expected queue wait"""
+    return min(MAX_WAIT_TIMEOUT, max(MIN_WAIT_TIMEOUT, WAIT_TIMEOUT_FACTOR * expected_wait))
+
+class Ticket:
+    """One request waiting for, or holding, a model slot"""
+
+    def __init__(self, priority, user, modality, seq):
+        self.priority = priority
+        self.rank = PRIORITIES.index(priority)
+        self.user = user
+        self.modality = modality
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+        self.expected_wait = 0.0
+
+class ReportScheduler:
+    """Priority queue with concurrency caps in front of the model"""
+
+    def __init__(self, concurrency=MODEL_CONCURRENCY, reserved_stat=RESERVED_STAT_SLOTS,
+                 per_user=PER_USER_LIMIT, per_modality=PER_MODALITY_LIMIT, queue_limits=None,
+                 history=1000):
+        self.concurrency = concurrency
+        self.reserved_stat = reserved_stat
+        self.per_user = per_user
+        self.per_modality = per_modality
+        self.queue_limits = dict(QUEUE_LIMITS if queue_limits is None else queue_limits)
+        self._condition = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running = []
+        self._service_seconds = INITIAL_SERVICE_SECONDS
+        self._waits = {priority: deque(maxlen=history) for priority in PRIORITIES}
+        self._rejected = {priority: 0 for priority in PRIORITIES}
+        self._served = {priority: 0 for priority in PRIORITIES}
+        self._timed_out = {priority: 0 for priority in PRIORITIES}
+
+    def _slots_for(self, rank):
+        """Number of slots a priority class may occupy"""
+        return self.concurrency if rank == 0 else max(1, self.concurrency - self.reserved_stat)
+
+    def _eligible(self, ticket):
+        """Whether the ticket could start now given the caps"""
+        if len(self._running) >= self._slots_for(ticket.rank):
+            return False
+        if ticket.user is not None and sum(t.user == ticket.user for t in self._running) >= self.per_user:
+            return False
+        if ticket.rank > 0 and ticket.modality is not None:
+            if sum(t.modality == ticket.modality for t in self._running) >= self.per_modality:
+                return False
+        return True
+
+    def _dispatch(self):
+        """Start every waiting ticket that may run, most urgent first"""
+        started = False
+        for ticket in sorted(self._waiting, key=lambda t: (t.rank, t.seq)):
+            if len(self._running) >= self.concurrency:
+                break
+            if self._eligible(ticket):
+                self._waiting.remove(ticket)
+                ticket.started_at = time.monotonic()
+                self._running.append(ticket)
+                self._waits[ticket.priority].append(ticket.started_at - ticket.enqueued_at)
+                self._served[ticket.priority] += 1
+                started = True
+        if started:
+            self._condition.notify_all()
+
+    def _estimate_wait(self, rank):
+        """Expected queue wait in seconds for a new request of the given class"""
+        ahead = sum(t.rank <= rank for t in self._waiting)
+        slots = self._slots_for(rank)
+        backlog = ahead + len(self._running) - slots + 1
+        return max(0.0, backlog * self._service_seconds / slots)
+
+    def expected_wait(self, priority):
+        """Expected queue wait in seconds for a request submitted now"""
+        with self._condition:
+            return self._estimate_wait(PRIORITIES.index(priority))
+
+    def submit(self, priority, user=None, modality=None):
+        """Queue a request, or raise QueueFull if its class is over the depth limit"""
+        with self._condition:
+            rank = PRIORITIES.index(priority)
+            limit = self.queue_limits.get(priority)
+            if limit is not None and len(self._waiting) >= limit:
+                self._rejected[priority] += 1
+                raise QueueFull(priority, len(self._waiting), self._estimate_wait(rank))
+            ticket = Ticket(priority, user, modality, next(self._seq))
+            ticket.expected_wait = self._estimate_wait(rank)
+            self._waiting.append(ticket)
+            self._dispatch()
+            return ticket
+
+    def wait(self, ticket, timeout=None):
+        """Block until the ticket holds a slot; on timeout cancel it and return False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while ticket.started_at is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    # Counted so requests that gave up still show in the wait figures
+                    self._waiting.remove(ticket)
+                    self._waits[ticket.priority].append(time.monotonic() - ticket.enqueued_at)
+                    self._timed_out[ticket.priority] += 1
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def release(self, ticket):
+        """Free the ticket's slot (or drop it from the queue) and start the next request"""
+        with self._condition:
+            if ticket in self._running:
+                self._running.remove(ticket)
+                elapsed = time.monotonic() - ticket.started_at
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * elapsed
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._dispatch()
+
+    def stats(self):
+        """Queue depth, running count, rejections, timeouts and wait percentiles per class.
+
+        Wait figures cover requests that got a slot and requests that timed out.
+        """
+        with self._condition:
+            result = {}
+            for priority in PRIORITIES:
+                waits = sorted(self._waits[priority])
+                result[priority] = {
+                    "waiting": sum(t.priority == priority for t in self._waiting),
+                    "running": sum(t.priority == priority for t in self._running),
+                    "rejected": self._rejected[priority],
+                    "served": self._served[priority],
+                    "timed_out": self._timed_out[priority],
+                    "mean_wait": sum(waits) / len(waits) if waits else 0.0,
+                    "p95_wait": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+                    "max_wait": waits[-1] if waits else 0.0,
+                }
+            return result
+
+# Shared by every session in the process
+scheduler = ReportScheduler()
@@ -0,0 +1,76 @@
+"""Load-test the report scheduler with simulated model calls.
+
+Usage:
+    python simulate_scheduler.py [--requests 300] [--rate 5.0] [--service 1.0] [--stat-share 0.05]
+
+Requests arrive at the given rate (per second) with exponentially
+distributed gaps and a mix of priorities, users and modalities. Each model
+call sleeps for a random time around --service seconds. At the end queue
+wait per class is printed, which shows whether STAT latency stays bounded
+while routine work backs up or is turned away.
+"""
+import argparse
+import random
+import threading
+import time
+from report_scheduler import PRIORITIES, QueueFull, ReportScheduler, wait_timeout
+
+MODALITIES = ("X-ray Analysis", "CT Scan Analysis", "MRI Scan Analysis", "Ultrasound Analysis")
+
+def client(scheduler, priority, user, modality, service, timeout):
+    """Submit one request, hold the slot for the simulated call, then release it"""
+    try:
+        ticket = scheduler.submit(priority, user=user, modality=modality)
+    except QueueFull:
+        return
+    try:
+        # Same bound as the app unless a fixed timeout is given
+        if not scheduler.wait(ticket, timeout=timeout or wait_timeout(ticket.expected_wait)):
+            return
+        time.sleep(random.uniform(0.5, 1.5) * service)
+    finally:
+        scheduler.release(ticket)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=5.0, help="arrivals per second")
+    parser.add_argument('--service', type=float, default=1.0, help="mean seconds per model call")
+    parser.add_argument('--stat-share', type=float, default=0.05)
+    parser.add_argument('--urgent-share', type=float, default=0.15)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, help="seconds to wait for a slot (default: as in the app)")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    scheduler = ReportScheduler()
+    threads = []
+    start = time.monotonic()
+    for _ in range(args.requests):
+        roll = random.random()
+        if roll < args.stat_share:
+            priority = "STAT"
+        elif roll < args.stat_share + args.urgent_share:
+            priority = "Urgent"
+        else:
+            priority = "Routine"
+        thread = threading.Thread(target=client, args=(
+            scheduler, priority, f"user{random.randrange(args.users)}", random.choice(MODALITIES), args.service, args.timeout))
+        thread.start()
+        threads.append(thread)
+        time.sleep(random.expovariate(args.rate))
+    for thread in threads:
+        thread.join()
+
+    print(f"{args.requests} requests in {time.monotonic() - start:.1f}s, "
+          f"concurrency {scheduler.concurrency}, offered load {args.rate * args.service / scheduler.concurrency:.1f}x")
+    print(f"{'class':<10}{'served':>8}{'rejected':>10}{'timed out':>11}{'mean wait':>12}{'p95 wait':>12}{'max wait':>12}")
+    stats = scheduler.stats()
+    for priority in PRIORITIES:
+        s = stats[priority]
+        print(f"{priority:<10}{s['served']:>8}{s['rejected']:>10}{s['timed_out']:>11}{s['mean_wait']:>11.2f}s"
+              f"{s['p95_wait']:>11.2f}s{s['max_wait']:>11.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Train the offline modality classifier from a labeled image folder.
+
+Usage:
+    python train_classifier.py DATASET [--output models/modality_classifier.npz]
+
+DATASET must contain one subfolder per modality, e.g. xray/, ct/, mri/ and
+ultrasound/ (see FOLDER_ALIASES in modality_classifier.py for accepted names).
+"""
+import argparse
+from collections import Counter
+from PIL import Image
+from modality_classifier import MODEL_PATH, extract_features, load_labeled_folder, save_model, train_model
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('dataset', help="folder with one subfolder per modality")
+    parser.add_argument('--output', default=MODEL_PATH, help="where to write the model arrays")
+    parser.add_argument('--epochs', type=int, default=2000)
+    args = parser.parse_args()
+
+    samples = load_labeled_folder(args.dataset)
+    if not samples:
+        parser.error(f"no labeled images found in {args.dataset}")
+
+    features, labels = [], []
+    for path, label in samples:
+        try:
+            with Image.open(path) as image:
+                features.append(extract_features(image))
+            labels.append(label)
+        except Exception as e:
+            print(f"Skipping {path}: {e}")
+
+    print("Training on " + ", ".join(f"{label}: {count}" for label, count in sorted(Counter(labels).items())))
+    save_model(train_model(features, labels, epochs=args.epochs), args.output)
+    print(f"Model saved to {args.output}")
+
+if __name__ == '__main__':
+    main()